@@ -1,13 +1,18 @@
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import timedelta
 import time
-from functools import wraps
-from flask import Blueprint, request, render_template_string, jsonify
+import threading
+import heapq
+import hmac
+import hashlib
+from operator import itemgetter
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_httpauth import HTTPBasicAuth
+from jinja2 import Environment
+from markupsafe import escape
 from werkzeug.security import generate_password_hash, check_password_hash
-import discord
-from bot_logic import MOD_LOGS_FILE, METRICS_FILE, bot, BOT_START_TIME, get_active_chatters 
+from bot_logic import MOD_LOGS_FILE, METRICS_FILE, bot, BOT_START_TIME, get_active_chatters, loads_json
 
 # --- CONFIGURATION ---
 admin_bp = Blueprint('admin', __name__)
@@ -16,28 +21,171 @@ auth = HTTPBasicAuth()
 # Fetch credentials from environment variables (MANDATORY for security)
 ADMIN_USER = os.environ.get('ADMIN_USER')
 ADMIN_PASS_HASHED = generate_password_hash(os.environ.get('ADMIN_PASS')) if os.environ.get('ADMIN_PASS') else None
+ADMIN_USER_BYTES = ADMIN_USER.encode() if ADMIN_USER else None
 
 # --- AUTHENTICATION ---
 
 @auth.verify_password
 def verify_password(username, password):
     """Verifies the username and password against environment variables."""
-    if ADMIN_USER and ADMIN_PASS_HASHED:
-        if username == ADMIN_USER and check_password_hash(ADMIN_PASS_HASHED, password):
+    if ADMIN_USER_BYTES and ADMIN_PASS_HASHED:
+        # Constant-time username check first, so wrong-user attempts never pay for the KDF.
+        if not hmac.compare_digest((username or '').encode(), ADMIN_USER_BYTES):
+            return None
+        if check_password_hash(ADMIN_PASS_HASHED, password):
             return username
     return None
 
 # --- UTILITY FUNCTIONS ---
 
-def load_data(filepath, default_data):
-    """Safely loads data from a JSON file."""
-    if os.path.exists(filepath):
+# Parsed file contents keyed by filepath -> (file version, data). The bot writes these files
+# far less often than the dashboard is loaded, so we only re-parse when they change.
+# The version includes st_size because the mod log is appended in place and two appends can
+# share one coarse mtime tick, and st_ino because the metrics file is replaced via os.replace.
+_FILE_CACHE = {}
+_FILE_CACHE_LOCK = threading.Lock()
+
+def load_cached_entry(filepath, default_data, parse):
+    """
+    Returns (version, parse(file)) for filepath, re-parsing only when the file has changed.
+    The version is (st_mtime_ns, st_size, st_ino), or None when default_data is returned.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None, default_data
+    version = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    cached = _FILE_CACHE.get(filepath)
+    if cached is not None and cached[0] == version:
+        return cached
+
+    with _FILE_CACHE_LOCK:
+        # Another request may have refreshed the entry while we waited for the lock.
+        cached = _FILE_CACHE.get(filepath)
+        if cached is not None and cached[0] == version:
+            return cached
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
+            with open(filepath, 'rb') as f:
+                data = parse(f)
         except Exception as e:
             print(f"Error loading {filepath}: {e}")
-    return default_data
+            return None, default_data
+        _FILE_CACHE[filepath] = (version, data)
+        return version, data
+
+def load_cached(filepath, default_data, parse):
+    """Returns parse(file) for filepath, re-parsing only when the file has changed."""
+    return load_cached_entry(filepath, default_data, parse)[1]
+
+def parse_json_file(f):
+    """Parses a whole JSON file (orjson when installed, like the bot's own loader)."""
+    return loads_json(f.read())
+
+def load_data(filepath, default_data):
+    """Safely loads data from a JSON file."""
+    return load_cached(filepath, default_data, parse_json_file)
+
+def parse_log_lines(f):
+    """Parses a JSON Lines moderation log into a list, newest entry first."""
+    logs = []
+    for line in f:
+        try:
+            logs.append(loads_json(line))
+        except json.JSONDecodeError:
+            # Blank line, or the bot is mid-append; re-read once the file grows.
+            continue
+    logs.reverse()
+    return logs
+
+def load_logs(filepath):
+    """Loads the moderation log (newest first), streaming it line by line."""
+    return load_cached(filepath, [], parse_log_lines)
+
+# Values derived from a loaded file, keyed by name -> (source object, value). Since
+# load_data hands back the same object until the file changes, identity is enough.
+_DERIVED_CACHE = {}
+
+def derive(name, source, builder):
+    """Returns builder(source), rebuilding only when load_data produced a new object."""
+    cached = _DERIVED_CACHE.get(name)
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    value = builder(source)
+    _DERIVED_CACHE[name] = (source, value)
+    return value
+
+def build_search_keys(logs):
+    """Pre-lowers the searchable fields of every log entry, one key per entry."""
+    # Fields are NUL-separated so a query can never match across two of them.
+    return [
+        f"{log.get('target_id', '')}\0{log.get('reason', '')}\0{log.get('action', '')}".lower()
+        for log in logs
+    ]
+
+def format_log_time(ts):
+    """Formats an ISO timestamp as 'YYYY-MM-DD HH:MM' by fixed-width slicing."""
+    if not ts or len(ts) < 16:
+        return ts or 'N/A'
+    return ts[:10] + ' ' + ts[11:16]
+
+def prepare_log_rows(logs):
+    """Builds the display row for every log entry, with guest-supplied text escaped once."""
+    return [
+        {
+            'time': format_log_time(log.get('timestamp')),
+            'action': escape(log.get('action', 'N/A')),
+            'target_id': escape(log.get('target_id', 'N/A')),
+            'moderator_id': escape(log.get('moderator_id', 'N/A')),
+            'reason': escape(log.get('reason', 'No reason provided')),
+        }
+        for log in logs
+    ]
+
+def serialize_metrics(metrics):
+    """Encodes the metrics payload for the API once, along with its ETag."""
+    body = jsonify(metrics).get_data()
+    return body, hashlib.sha1(body).hexdigest()
+
+# Channel names resolved through the bot's cache, keyed by the stored (string) ID.
+# Cleared when the bot (re)connects; an entry is dropped when its channel is renamed or deleted.
+_CHANNEL_NAMES = {}
+
+@bot.listen('on_ready')
+async def _reset_channel_names():
+    _CHANNEL_NAMES.clear()
+
+@bot.listen('on_guild_channel_update')
+async def _forget_channel_name(before, after):
+    _CHANNEL_NAMES.pop(str(after.id), None)
+
+@bot.listen('on_guild_channel_delete')
+async def _forget_deleted_channel_name(channel):
+    _CHANNEL_NAMES.pop(str(channel.id), None)
+
+def channel_name(cid):
+    """Resolves a channel ID to its name, falling back to the raw ID if unknown."""
+    name = _CHANNEL_NAMES.get(cid)
+    if name is None:
+        channel = bot.get_channel(int(cid))
+        if channel is None:
+            return f"ID: {cid}"
+        name = _CHANNEL_NAMES[cid] = channel.name
+    return name
+
+def summarize_metrics(metrics):
+    """Computes the KPI inputs that depend only on the metrics file contents."""
+    # Monthly Summary
+    monthly_summary = metrics.get('monthly_summary', {})
+    
+    # Top 3 Channels (Approximation based on last saved metrics)
+    channel_messages = metrics.get('messages_by_channel', {})
+    top_channels = heapq.nlargest(3, channel_messages.items(), key=itemgetter(1))
+    
+    return {
+        'monthly_actions': f"Kick: {monthly_summary.get('total_kicks', 0)} | Mute: {monthly_summary.get('total_mutes', 0)} | Ban: {monthly_summary.get('total_bans', 0)}",
+        'top_channels': top_channels,
+    }
 
 def calculate_kpis(metrics):
     """Calculates key performance indicators for the dashboard."""
@@ -50,78 +198,48 @@ def calculate_kpis(metrics):
     # Calculate Unique Active Chatters
     unique_active_chatters = len(get_active_chatters())
     
-    # Total members (Approximation since bot doesn't fetch on startup)
-    total_members = sum(1 for guild in bot.guilds for member in guild.members) if bot.is_ready() else "N/A"
-    
-    # Monthly Summary
-    monthly_summary = metrics.get('monthly_summary', {})
+    # Read once; the bot thread can flip this mid-request
+    ready = bot.is_ready()
+
+    # Total members (Guild.member_count is kept by discord.py, no need to walk the member cache)
+    total_members = sum(guild.member_count or 0 for guild in bot.guilds) if ready else "N/A"
     
-    # Top 3 Channels (Approximation based on last saved metrics)
-    channel_messages = metrics.get('messages_by_channel', {})
-    top_channels = sorted(
-        [(cid, count) for cid, count in channel_messages.items()],
-        key=lambda item: item[1],
-        reverse=True
-    )[:3]
+    # Parts that only change when the bot rewrites the metrics file
+    summary = derive('metrics_summary', metrics, summarize_metrics)
+
+    top_channels = summary['top_channels']
     
     # Try to resolve channel names
-    resolved_channels = []
-    if bot.is_ready():
-        for cid, count in top_channels:
-            channel = bot.get_channel(int(cid))
-            name = channel.name if channel else f"ID: {cid}"
-            resolved_channels.append((name, count))
+    if ready:
+        resolved_channels = [(channel_name(cid), count) for cid, count in top_channels]
     else:
         resolved_channels = [(f"ID: {cid}", count) for cid, count in top_channels]
 
 
     kpis = {
         'uptime': uptime,
-        'guild_count': len(bot.guilds) if bot.is_ready() else 0,
+        'guild_count': len(bot.guilds) if ready else 0,
         'member_count': total_members,
         'unique_active_chatters': unique_active_chatters,
-        'monthly_actions': f"Kick: {monthly_summary.get('total_kicks', 0)} | Mute: {monthly_summary.get('total_mutes', 0)} | Ban: {monthly_summary.get('total_bans', 0)}",
+        'monthly_actions': summary['monthly_actions'],
         'top_channels': resolved_channels
     }
     return kpis
 
-# --- ROUTES ---
+# --- HTML TEMPLATES ---
 
-@admin_bp.route('/', methods=['GET', 'POST'])
-@auth.login_required
-def dashboard():
-    """Main Caretaker Log Dashboard."""
-    
-    # Load data for dashboard display
-    logs = load_data(MOD_LOGS_FILE, {'logs': []}).get('logs', [])
-    metrics = load_data(METRICS_FILE, {})
-    kpis = calculate_kpis(metrics)
-    
-    # Handle search functionality
-    search_query = request.form.get('search_query', '')
-    search_results = None
-    
-    if request.method == 'POST' and search_query:
-        # Search for user ID or part of the reason/action
-        search_results = [
-            log for log in logs 
-            if search_query.lower() in str(log.get('target_id', '')).lower() or
-               search_query.lower() in log.get('reason', '').lower() or
-               search_query.lower() in log.get('action', '').lower()
-        ]
-
-    # Render HTML template
-    # --- HTML TEMPLATE START ---
-    html_template = f"""
+# Compiled once at import and rendered with per-request context. Autoescaping keeps
+# guest-supplied text (reasons, search queries) from being interpreted as markup.
+DASHBOARD_TEMPLATE = Environment(autoescape=True).from_string("""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Aura Caretaker Log</title>
-        <script src="https://cdn.tailwindcss.com"></script>
+        <link rel="stylesheet" href="{{ css_url }}">
         <style>
-            :root {{
+            :root {
                 --bg-color: #1f2937; /* Dark slate */
                 --card-bg: #374151; /* Slightly lighter card */
                 --text-color: #f3f4f6; /* Light gray text */
@@ -129,25 +247,25 @@ def dashboard():
                 --danger-color: #ef4444; /* Red for bans */
                 --warn-color: #f59e0b; /* Yellow for mutes */
                 --primary-action: #3b82f6; /* Blue for primary actions */
-            }}
-            body {{
+            }
+            body {
                 font-family: 'Inter', sans-serif;
                 background-color: var(--bg-color);
                 color: var(--text-color);
-            }}
-            .card {{
+            }
+            .card {
                 background-color: var(--card-bg);
                 border-radius: 0.5rem;
                 box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-            }}
-            .text-accent {{ color: var(--accent-color); }}
-            .bg-accent-light {{ background-color: #4ade80; }}
-            .btn-search {{ background-color: var(--primary-action); }}
-            .btn-search:hover {{ background-color: #2563eb; }}
-            .action-BAN {{ color: var(--danger-color); font-weight: bold; }}
-            .action-MUTE {{ color: var(--warn-color); font-weight: bold; }}
-            .action-KICK {{ color: var(--accent-color); font-weight: bold; }}
-            .action-FLAG {{ color: #a855f7; font-weight: bold; }}
+            }
+            .text-accent { color: var(--accent-color); }
+            .bg-accent-light { background-color: #4ade80; }
+            .btn-search { background-color: var(--primary-action); }
+            .btn-search:hover { background-color: #2563eb; }
+            .action-BAN { color: var(--danger-color); font-weight: bold; }
+            .action-MUTE { color: var(--warn-color); font-weight: bold; }
+            .action-KICK { color: var(--accent-color); font-weight: bold; }
+            .action-FLAG { color: #a855f7; font-weight: bold; }
         </style>
     </head>
     <body>
@@ -161,19 +279,19 @@ def dashboard():
             <div class="grid grid-cols-1 sm:grid-cols-2 lg:grid-cols-4 gap-6 mb-8">
                 <div class="card p-5">
                     <p class="text-sm font-medium text-gray-400">Uptime</p>
-                    <p class="text-2xl font-bold mt-1 text-accent">{kpis['uptime']}</p>
+                    <p class="text-2xl font-bold mt-1 text-accent">{{ kpis.uptime }}</p>
                 </div>
                 <div class="card p-5">
                     <p class="text-sm font-medium text-gray-400">Total Guests</p>
-                    <p class="text-2xl font-bold mt-1 text-accent">{kpis['member_count']}</p>
+                    <p class="text-2xl font-bold mt-1 text-accent">{{ kpis.member_count }}</p>
                 </div>
                 <div class="card p-5">
-                    <p class="text-sm font-medium text-gray-400">Active Chatters (Current Session)</p>
-                    <p class="text-2xl font-bold mt-1 text-accent">{kpis['unique_active_chatters']}</p>
+                    <p class="text-sm font-medium text-gray-400">Active Chatters (Last 24h)</p>
+                    <p class="text-2xl font-bold mt-1 text-accent">{{ kpis.unique_active_chatters }}</p>
                 </div>
                 <div class="card p-5">
                     <p class="text-sm font-medium text-gray-400">Monthly Time-Outs/Barrings</p>
-                    <p class="text-lg font-bold mt-1 text-accent">{kpis['monthly_actions']}</p>
+                    <p class="text-lg font-bold mt-1 text-accent">{{ kpis.monthly_actions }}</p>
                 </div>
             </div>
 
@@ -184,7 +302,7 @@ def dashboard():
                     <div class="col-span-1">
                         <p class="text-sm font-medium text-gray-400">Top 3 Channels by Message Count (since last reset)</p>
                         <ul class="mt-2 space-y-1">
-                            {''.join([f'<li class="text-sm"><span class="text-accent">#{name}:</span> {count} msgs</li>' for name, count in kpis['top_channels']])}
+                            {% for name, count in kpis.top_channels %}<li class="text-sm"><span class="text-accent">#{{ name }}:</span> {{ count }} msgs</li>{% endfor %}
                         </ul>
                     </div>
                 </div>
@@ -195,14 +313,13 @@ def dashboard():
             <div class="card p-6 mb-8">
                 <h2 class="text-xl font-semibold mb-4 border-b border-gray-700 pb-2">Guestbook Search</h2>
                 <form method="POST" action="/admin" class="flex space-x-4">
-                    <input type="text" name="search_query" placeholder="Search by Guest ID, Action, or Reason" value="{search_query}" 
+                    <input type="text" name="search_query" placeholder="Search by Guest ID, Action, or Reason" value="{{ search_query }}" 
                            class="flex-grow p-2 rounded bg-gray-600 border border-gray-700 focus:ring-accent focus:border-accent" required>
                     <button type="submit" class="btn-search px-4 py-2 text-white font-medium rounded hover:shadow-md transition">Search</button>
                 </form>
-
-                {f"""
+                {% if search_results is not none %}
                 <div class="mt-6">
-                    <h3 class="text-lg font-medium mb-3 text-gray-300">Search Results: {len(search_results)} found for "{search_query}"</h3>
+                    <h3 class="text-lg font-medium mb-3 text-gray-300">Search Results: {{ search_results|length }} found for "{{ search_query }}"</h3>
                     <div class="overflow-x-auto">
                         <table class="min-w-full divide-y divide-gray-700">
                             <thead class="bg-gray-700">
@@ -215,23 +332,20 @@ def dashboard():
                                 </tr>
                             </thead>
                             <tbody class="divide-y divide-gray-700">
-                                {''.join([
-                                    f"""
+                                {% for row in search_results %}
                                     <tr class="hover:bg-gray-600 transition">
-                                        <td class="px-4 py-3 whitespace-nowrap text-sm">{log['timestamp'][:16].replace('T', ' ')}</td>
-                                        <td class="px-4 py-3 whitespace-nowrap text-sm action-{log['action']}">{log['action']}</td>
-                                        <td class="px-4 py-3 whitespace-nowrap text-sm font-mono">{log['target_id']}</td>
-                                        <td class="px-4 py-3 whitespace-nowrap text-sm font-mono">{log['moderator_id']}</td>
-                                        <td class="px-4 py-3 text-sm max-w-xs overflow-hidden text-ellipsis">{log['reason']}</td>
+                                        <td class="px-4 py-3 whitespace-nowrap text-sm">{{ row.time }}</td>
+                                        <td class="px-4 py-3 whitespace-nowrap text-sm action-{{ row.action }}">{{ row.action }}</td>
+                                        <td class="px-4 py-3 whitespace-nowrap text-sm font-mono">{{ row.target_id }}</td>
+                                        <td class="px-4 py-3 whitespace-nowrap text-sm font-mono">{{ row.moderator_id }}</td>
+                                        <td class="px-4 py-3 text-sm max-w-xs overflow-hidden text-ellipsis">{{ row.reason }}</td>
                                     </tr>
-                                    """
-                                    for log in search_results
-                                ])}
+                                {% endfor %}
                             </tbody>
                         </table>
                     </div>
                 </div>
-                """ if search_results is not None else ''}
+                {% endif %}
             </div>
 
             <!-- Footer Link -->
@@ -242,13 +356,49 @@ def dashboard():
         </div>
     </body>
     </html>
-    """
+""")
+
+# --- ROUTES ---
+
+@admin_bp.route('/', methods=['GET', 'POST'])
+@auth.login_required
+def dashboard():
+    """Main Caretaker Log Dashboard."""
+    
+    # Load data for dashboard display
+    logs = load_logs(MOD_LOGS_FILE)
+    metrics = load_data(METRICS_FILE, {})
+    kpis = calculate_kpis(metrics)
+    
+    # Handle search functionality
+    search_query = request.form.get('search_query', '')
+    search_results = None
     
-    return render_template_string(html_template)
+    if request.method == 'POST' and search_query:
+        # Search for user ID or part of the reason/action
+        needle = search_query.lower()
+        search_keys = derive('log_search_keys', logs, build_search_keys)
+        log_rows = derive('log_rows', logs, prepare_log_rows)
+        search_results = [row for row, key in zip(log_rows, search_keys) if needle in key]
+
+    return DASHBOARD_TEMPLATE.render(
+        kpis=kpis,
+        search_query=search_query,
+        search_results=search_results,
+        css_url=current_app.config['AURA_CSS_URL'],
+    )
 
 @admin_bp.route('/data/metrics')
 @auth.login_required
 def metrics_api():
     """API endpoint to get the latest metrics data (for future API calls)."""
-    metrics = load_data(METRICS_FILE, {})
-    return jsonify(metrics)
\ No newline at end of file
+    # The version is the one the body was parsed from, so Last-Modified always matches the ETag
+    version, metrics = load_cached_entry(METRICS_FILE, {}, parse_json_file)
+    body, etag = derive('metrics_response', metrics, serialize_metrics)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    if version is not None:
+        response.last_modified = version[0] / 1e9
+    # Answers If-None-Match / If-Modified-Since with a bodyless 304 when nothing changed
+    return response.make_conditional(request)
\ No newline at end of file
@@ -1,11 +1,31 @@
 import os
-from flask import Flask, render_template_string
+import re
+import gzip
+import hashlib
+import logging
+import textwrap
+from flask import Flask, Response, request, send_from_directory
+from jinja2 import Environment
 import threading
 import asyncio # <-- Added missing import
-from bot_logic import bot 
+try:
+    import fcntl # POSIX file locks for the one-bot-per-host guard (not available on Windows)
+except ImportError:
+    fcntl = None
+try:
+    import uvloop # Faster libuv-based event loop for the bot (not available on Windows)
+except ImportError:
+    uvloop = None
+from bot_logic import bot, TOKEN, close_http_session, load_initial_data
 from admin_dashboard import admin_bp 
 
 # --- CONFIGURATION ---
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+log = logging.getLogger("aura")
+
+# Port for the local development server (Gunicorn binds via its own config)
+PORT = int(os.environ.get('PORT', 5000))
+
 # Example social links used in the landing page template
 DISCORD_SOCIAL_LINKS = [
     ("Twitter", "https://twitter.com/YourHandle"),
@@ -13,90 +33,189 @@ DISCORD_SOCIAL_LINKS = [
     ("Patreon", "https://patreon.com/YourPage")
 ]
 
-app = Flask(__name__)
+# The built-in static route is replaced below so its files can be cached as immutable.
+app = Flask(__name__, static_folder=None)
 
 # Register the admin blueprint and protect it behind the /admin URL prefix.
 app.register_blueprint(admin_bp, url_prefix='/admin')
 
 # --- START BOT IN A SEPARATE THREAD (For 24/7 Hosting) ---
 
-def start_discord_bot():
+class BotLoopThread(threading.Thread):
     """
-    Function to run the Discord bot's blocking client method safely in a thread.
+    Daemon thread that owns the Discord bot's event loop for the life of the process.
     
-    NOTE: This uses bot.start/loop.run_until_complete to safely run the bot in 
-    a separate thread, avoiding the fatal "RuntimeError: can't register atexit after shutdown".
+    NOTE: The loop is created once and kept on the thread, so stop() can cancel the
+    bot from another thread (Gunicorn's worker_exit hook) and let it log out cleanly.
     """
-    print("--- Aura Manager: Starting Discord Bot Thread -----")
-    try:
-        # 1. Create a new event loop for this thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # 2. Use bot.start() to run the bot and run_until_complete to block the thread
-        token = os.getenv('DISCORD_BOT_TOKEN')
-        if not token:
-            print("ERROR: DISCORD_BOT_TOKEN is missing. Bot will not start.")
+
+    def __init__(self, token):
+        super().__init__(name='aura-bot-loop', daemon=True)
+        self.token = token
+        # Only this thread's loop uses uvloop; the global event loop policy is left alone.
+        self.loop = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+        self.bot_task = None
+        self.stopping = False
+
+    def run(self):
+        # During a reload the old worker still holds the lock until it has logged out,
+        # so wait for it here instead of giving up and leaving the bot offline.
+        if not acquire_bot_lock():
+            log.info("Another process holds %s; waiting for it before starting the bot.", BOT_LOCK_FILE)
+            acquire_bot_lock(blocking=True)
+        if self.stopping:
             return
+        # The data loaded at import may predate the previous bot's last writes; reload it
+        # now that nothing else can append to the files.
+        load_initial_data()
+        log.info("Starting Discord bot thread")
+        asyncio.set_event_loop(self.loop)
+        self.bot_task = self.loop.create_task(self._run_bot())
+        self.bot_task.add_done_callback(self._on_bot_exit)
+        self.loop.run_forever()
 
-        loop.run_until_complete(bot.start(token, reconnect=True))
+    async def _run_bot(self):
+        """Runs the bot until it stops or is cancelled, always closing the gateway session."""
+        try:
+            await bot.start(self.token, reconnect=True)
+        finally:
+            if not bot.is_closed():
+                await bot.close()
+            await close_http_session()
 
-    except Exception as e:
-        print(f"FATAL ERROR IN DISCORD BOT THREAD: {e}")
+    def _on_bot_exit(self, task):
+        """Reports why bot.start() returned and lets the thread finish."""
+        if not task.cancelled() and task.exception():
+            log.error("FATAL ERROR IN DISCORD BOT THREAD", exc_info=task.exception())
+        self.loop.stop()
 
-print("--- Gunicorn Worker Booted, Initiating Bot Startup ---")
-# Only start the thread if the bot token is available
-if os.getenv('DISCORD_BOT_TOKEN'):
-    discord_thread = threading.Thread(target=start_discord_bot)
-    discord_thread.daemon = True 
-    discord_thread.start()
-else:
-    print("WARNING: DISCORD_BOT_TOKEN is not set. Discord bot thread skipped.")
+    def stop(self, timeout=10):
+        """
+        Cancels the bot from another thread and waits for it to log out.
 
+        NOTE: Gunicorn's worker_exit hook calls this, so the gateway connection is closed
+        cleanly instead of being dropped when the worker process exits.
+        """
+        self.stopping = True
+        if self.bot_task is None:
+            # Still waiting on the lock; the daemon thread dies with the process.
+            return
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.bot_task.cancel)
+        self.join(timeout)
 
-# --- FLASK ROUTES ---
 
-@app.route('/')
-def index():
+# The running bot thread (one per process), set by start_bot_thread()
+bot_thread = None
+
+# Host-wide lock file; whichever process holds it owns the Discord gateway session
+BOT_LOCK_FILE = os.getenv('AURA_BOT_LOCK_FILE', '/tmp/aura.bot.lock')
+_bot_lock = None
+
+def acquire_bot_lock(blocking=False):
+    """
+    Takes an exclusive lock on BOT_LOCK_FILE, held until the process exits.
+
+    NOTE: gunicorn.conf.py runs a single worker, but `gunicorn -w N` on the command line
+    overrides it. The lock makes sure only one worker at a time connects the bot,
+    instead of N workers each opening their own gateway session.
     """
-    Renders the public-facing landing page for the Aura (Treehouse Hangout) Bot.
+    global _bot_lock
+    if fcntl is None:
+        return True
+    lock = open(BOT_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.close()
+        return False
+    _bot_lock = lock
+    return True
+
+def start_bot_thread():
     """
-    # Using Tailwind-like classes and custom CSS variables for styling
-    html_content = f"""
+    Starts the Discord bot in a daemon thread of the current process.
+
+    NOTE: This is NOT called at import time. Under Gunicorn it runs from the post_fork
+    hook in gunicorn.conf.py, so the thread lives in the worker (threads do not survive
+    fork, so starting it before the worker exists would leave the worker without a bot).
+    """
+    global bot_thread
+
+    log.info("Worker booted (pid %s), initiating bot startup", os.getpid())
+    if bot_thread is not None:
+        return bot_thread
+
+    # Only start the thread if the bot token is available
+    if not TOKEN:
+        log.warning("DISCORD_BOT_TOKEN is not set. Discord bot thread skipped.")
+        return None
+
+    bot_thread = BotLoopThread(TOKEN)
+    bot_thread.start()
+    return bot_thread
+
+
+# --- STATIC ASSETS ---
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+def static_url(filename):
+    """Returns a /static URL versioned by the file's content hash, so it can be cached forever."""
+    with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    return f"/static/{filename}?v={digest}"
+
+# Pre-built utility CSS shared by the landing page and the admin dashboard
+# (replaces the in-browser Tailwind CDN compiler).
+app.config['AURA_CSS_URL'] = static_url('aura.css')
+
+@app.route('/static/<path:filename>')
+def static_files(filename):
+    """Serves files from static/. URLs carry a content hash, so browsers never need to revalidate."""
+    response = send_from_directory(STATIC_DIR, filename, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# --- TEMPLATES ---
+
+# Landing page, compiled once at import (Tailwind-like classes and custom CSS
+# variables for styling). Only the social links are filled in.
+LANDING_TEMPLATE = Environment(autoescape=True).from_string("""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Aura Bot - Treehouse Hangout</title>
-        <!-- Load Tailwind CSS via CDN -->
-        <script src="https://cdn.tailwindcss.com"></script>
+        <link rel="stylesheet" href="{{ css_url }}">
         <!-- Custom Styling for the "Treehouse Hangout" vibe -->
         <style>
-            :root {{
+            :root {
                 --primary-color: #6D9C8D; /* Soft Green/Mint */
                 --secondary-color: #F7E7CD; /* Cream/Beige */
                 --danger-color: #E63946; /* Soft Red */
                 --font-family: 'Inter', sans-serif;
-            }}
-            body {{
+            }
+            body {
                 font-family: var(--font-family);
                 background-color: #1a202c; /* Dark background */
                 color: #e2e8f0; /* Light text */
-            }}
-            .card {{
+            }
+            .card {
                 background-color: #2D3748; /* Slightly lighter dark card */
                 box-shadow: 0 10px 15px rgba(0, 0, 0, 0.5);
                 border: 1px solid #4A5568;
-            }}
-            .btn {{
+            }
+            .btn {
                 background-color: var(--primary-color);
                 color: #1a202c;
                 transition: background-color 0.3s;
-            }}
-            .btn:hover {{
+            }
+            .btn:hover {
                 background-color: #8EB8AD;
-            }}
+            }
         </style>
     </head>
     <body class="flex items-center justify-center min-h-screen p-4">
@@ -147,11 +266,10 @@ def index():
             <div class="space-y-4">
                 <p class="text-center text-gray-500 font-medium">Find the Community:</p>
                 <ul class="flex justify-center space-x-6 text-xl">
-                    <!-- Dynamic Links Block - CORRECTED PYTHON SYNTAX -->
-                    {'\n'.join([
-                        f"<li><a href='{url}' target='_blank' class='hover:text-[var(--primary-color)] transition'>{name}</a></li>"
-                        for name, url in DISCORD_SOCIAL_LINKS
-                    ])}
+                    <!-- Dynamic Links Block -->
+                    {% for name, url in links %}
+                    <li><a href='{{ url }}' target='_blank' class='hover:text-[var(--primary-color)] transition'>{{ name }}</a></li>
+                    {% endfor %}
                 </ul>
             </div>
 
@@ -172,16 +290,43 @@ def index():
         </div>
     </body>
     </html>
+""")
+
+def minify_html(html):
+    """Strips source indentation and whitespace between tags from a rendered page."""
+    html = textwrap.dedent(html).strip()
+    html = re.sub(r"\n\s+", "\n", html)
+    html = re.sub(r">\s+<", "><", html)
+    return html
+
+# Nothing on the page changes while the process runs, so render, minify and
+# compress it exactly once.
+LANDING_PAGE_BYTES = minify_html(LANDING_TEMPLATE.render(links=DISCORD_SOCIAL_LINKS, css_url=app.config['AURA_CSS_URL'])).encode('utf-8')
+LANDING_PAGE_GZIP = gzip.compress(LANDING_PAGE_BYTES, 9)
+
+# --- FLASK ROUTES ---
+
+@app.route('/')
+def index():
     """
-    
-    return render_template_string(html_content)
+    Serves the public-facing landing page for the Aura (Treehouse Hangout) Bot.
+    """
+    if request.accept_encodings['gzip'] > 0:
+        response = Response(LANDING_PAGE_GZIP, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(LANDING_PAGE_BYTES, mimetype='text/html')
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 if __name__ == '__main__':
     # This block is for local testing only (Gunicorn ignores this in production).
-    if os.getenv('DISCORD_BOT_TOKEN'):
-        print("Running Flask server locally...")
-        app.run(host='0.0.0.0', port=os.environ.get('PORT', 5000))
+    start_bot_thread()
+    if TOKEN:
+        log.info("Running Flask server locally...")
+        app.run(host='0.0.0.0', port=PORT)
     else:
         # Run without bot thread if token is missing (for local dev/testing the web part)
-        print("Running Flask server locally without Discord bot (DISCORD_BOT_TOKEN missing).")
-        app.run(host='0.0.0.0', port=os.environ.get('PORT', 5000))
\ No newline at end of file
+        log.info("Running Flask server locally without Discord bot (DISCORD_BOT_TOKEN missing).")
+        app.run(host='0.0.0.0', port=PORT)
\ No newline at end of file
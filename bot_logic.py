@@ -2,14 +2,24 @@
 # Core logic, commands, and events for Aura (The Caretaker).
 
 import os
+import re
 import json
+import atexit
+import hashlib
+import threading
 from datetime import datetime, timedelta
-from discord.ext import commands, tasks
+from discord.ext import commands
 import discord
 import asyncio
 import time 
+import bisect
 import collections 
+import itertools
 import aiohttp # For making external API calls (Gemini)
+try:
+    import orjson # Much faster JSON encode/decode; the stdlib json module is the fallback
+except ImportError:
+    orjson = None
 
 # --- CONFIGURATION & SETUP ---
 
@@ -19,7 +29,8 @@ COMMAND_PREFIX = '!'
 API_KEY = "" # Leave as-is for canvas environment to provide key
 
 # Filepaths
-MOD_LOGS_FILE = 'permanent_record.json'
+MOD_LOGS_FILE = 'permanent_record.jsonl' # Append-only, one JSON log entry per line (oldest first)
+LEGACY_MOD_LOGS_FILE = 'permanent_record.json' # Pre-JSONL format, migrated on startup
 METRICS_FILE = 'operational_metrics.json'
 
 # Role Names (ADJUST THESE TO MATCH YOUR SERVER'S ROLES)
@@ -28,20 +39,45 @@ MEMBER_ROLE_NAME = 'Regular' # Your primary member role
 MUTED_ROLE_NAME = 'Time-Out' # Your mute role
 STAFF_ROLE_NAME = 'Co-Host' # Role that should have access to mod commands/flags
 
+# Actions counted in the monthly summary and shown as incidents in !whois
+INCIDENT_ACTIONS = frozenset({'MUTE', 'KICK', 'BAN'})
+
+# Link fragments that get a message removed by the spam filter, compiled into one
+# case-insensitive pattern so each message is scanned once
+SUSPICIOUS_LINKS = ('bit.ly', 'tinyurl.com', '.xyz', '.cc', 'discord.gg')
+SUSPICIOUS_LINKS_RE = re.compile('|'.join(map(re.escape, SUSPICIOUS_LINKS)), re.IGNORECASE)
+
 # Channel IDs (PLACEHOLDERS - MUST BE UPDATED TO YOUR SERVER'S IDs)
 MOD_ALERT_CHANNEL_ID = 1424585869909819392 # Your alert channel (where !flag goes)
 WELCOME_CHANNEL_ID = 1424581257081262172 # Channel where the welcome message is sent
 
+# Welcome message posted in WELCOME_CHANNEL_ID ({mention} is filled in per member)
+WELCOME_TEMPLATE = (
+    "🏡 **Welcome to the Hangout, {mention}!** I'm Aura, here to keep things cozy. "
+    "The **[Host]** (that's the owner!) will give you the **[Regular]** role soon. "
+    "While you wait, check out **#house-rules**!"
+)
+
 # Gemini API Endpoint
 GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent"
 
 # In-Memory Metric Trackers
-ACTIVE_CHATTERS = set()
+ACTIVE_CHATTER_WINDOW = 24 * 60 * 60 # Seconds a user counts as "active" after their last message
+ACTIVE_CHATTERS = {} # user_id -> time of last message (pruned by metric_saver_loop)
+MEMBER_EVENT_RETENTION = 90 * 24 * 60 * 60 # Seconds of join/leave history kept in the metrics file
 CHANNEL_ACTIVITY = collections.defaultdict(int)
 
 # Global data containers and start time
-MOD_LOGS = {'logs': []}
 SERVER_METRICS = {}
+BANNED_IDS = set() # target_ids with a BAN record, for the join-time ban evasion check
+INCIDENTS_BY_TARGET = {} # target_id -> deque of that user's INCIDENT_ACTIONS entries, newest first
+ROLE_CACHE = {} # guild_id -> {role name: role id}, rebuilt lazily after role changes
+MOD_COMMANDS_EMBED = None # The !commands embed, built once at the end of this module
+HTTP_SESSION = None # Shared aiohttp session for outbound API calls (see get_http_session)
+# Set whenever SERVER_METRICS or CHANNEL_ACTIVITY change; wakes metric_saver_loop, the only writer.
+# Created before the bot's loop exists, which needs Python 3.10+ (pinned in .python-version).
+METRICS_DIRTY = asyncio.Event()
+METRICS_SAVER_TASK = None # The metric_saver_loop task, started once from on_ready
 BOT_START_TIME = time.time()
 
 # Intents are mandatory for modern discord bots
@@ -57,23 +93,72 @@ bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
 # --- HELPER FUNCTIONS ---
 
 def get_active_chatters():
-    return ACTIVE_CHATTERS
+    """Returns the IDs of users who chatted within ACTIVE_CHATTER_WINDOW (safe to call from any thread)."""
+    cutoff = time.time() - ACTIVE_CHATTER_WINDOW
+    return {user_id for user_id, last_seen in list(ACTIVE_CHATTERS.items()) if last_seen > cutoff}
+
+def prune_active_chatters():
+    """Forgets users whose last message is older than ACTIVE_CHATTER_WINDOW (event loop only)."""
+    cutoff = time.time() - ACTIVE_CHATTER_WINDOW
+    for user_id in [u for u, last_seen in ACTIVE_CHATTERS.items() if last_seen <= cutoff]:
+        del ACTIVE_CHATTERS[user_id]
+
+def get_http_session():
+    """Returns the shared aiohttp session, creating it on first use (must run on the bot's loop)."""
+    global HTTP_SESSION
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+    return HTTP_SESSION
+
+async def close_http_session():
+    """Closes the shared aiohttp session on shutdown."""
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+
+def get_role(guild, name):
+    """Finds a guild role by name via ROLE_CACHE instead of scanning guild.roles each time."""
+    role_ids = ROLE_CACHE.get(guild.id)
+    if role_ids is None:
+        # reversed() so the lowest role wins on duplicate names, like discord.utils.get
+        role_ids = ROLE_CACHE[guild.id] = {role.name: role.id for role in reversed(guild.roles)}
+    role_id = role_ids.get(name)
+    return guild.get_role(role_id) if role_id else None
+
+def dumps_json(data, compact=False):
+    """Serializes data to JSON as UTF-8 bytes (indented, or compact for machine-only files)."""
+    if orjson:
+        option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        return orjson.dumps(data, option=option)
+    # int keys become strings here too
+    if compact:
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return json.dumps(data, indent=2).encode('utf-8')
+
+def dumps_json_line(entry):
+    """Serializes one entry as a compact JSON Lines record (bytes, newline included)."""
+    if orjson:
+        return orjson.dumps(entry) + b'\n'
+    return json.dumps(entry).encode('utf-8') + b'\n'
+
+def loads_json(raw):
+    """Parses JSON from bytes (orjson.JSONDecodeError subclasses json.JSONDecodeError)."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
 
 def load_json(filepath, default_data={}):
     """Loads JSON data from a file, initializing with default data if necessary."""
     if not os.path.exists(filepath):
         print(f"File not found: {filepath}. Initializing with default structure.")
         try:
-            with open(filepath, 'w') as f:
-                json.dump(default_data, f, indent=4)
+            with open(filepath, 'wb') as f:
+                f.write(dumps_json(default_data))
             return default_data
         except Exception as e:
             print(f"ERROR: Could not create {filepath}. {e}")
             return default_data
     
     try:
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            return loads_json(f.read())
     except json.JSONDecodeError as e:
         print(f"ERROR: Error decoding JSON from {filepath}: {e}. Returning default data.")
         return default_data
@@ -81,21 +166,106 @@ def load_json(filepath, default_data={}):
         print(f"ERROR: Failed to read {filepath}. {e}")
         return default_data
 
-def save_json(filepath, data):
+# filepath -> blake2b digest of the bytes last written there, to skip identical rewrites
+_LAST_WRITE_HASH = {}
+# filepath -> lock held while that file is written (saver thread vs. the exit-time flush)
+_WRITE_LOCKS = {}
+
+def write_file(filepath, raw):
+    """
+    Atomically replaces a file with already-serialized bytes (safe to run in a worker thread).
+    Returns False if the write failed.
+
+    NOTE: The bytes go to a temp file that is fsynced and then renamed over the target,
+    so a crash mid-write leaves the previous version intact instead of a truncated file.
+    """
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    tmp_path = filepath + '.tmp'
+    # dict.setdefault is atomic, so every thread gets the same lock for a path
+    with _WRITE_LOCKS.setdefault(filepath, threading.Lock()):
+        if _LAST_WRITE_HASH.get(filepath) == digest:
+            return True
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
+            _LAST_WRITE_HASH[filepath] = digest
+            return True
+        except Exception as e:
+            print(f"ERROR: Failed to save data to {filepath}: {e}")
+            return False
+
+def save_json(filepath, data, compact=False):
     """Saves data to a JSON file."""
+    write_file(filepath, dumps_json(data, compact))
+
+def append_jsonl(filepath, entry):
+    """
+    Appends a single entry as one line to a JSON Lines file.
+
+    NOTE: A crash or full disk mid-append leaves a last line without its newline; the new
+    entry then starts on a fresh line instead of being glued onto (and lost with) it.
+    """
+    try:
+        line = dumps_json_line(entry)
+        with open(filepath, 'ab+') as f:
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    line = b'\n' + line
+            f.write(line)
+    except Exception as e:
+        print(f"ERROR: Failed to append to {filepath}: {e}")
+
+def load_mod_logs():
+    """Streams the moderation log from disk, newest entry first."""
+    if not os.path.exists(MOD_LOGS_FILE) and os.path.exists(LEGACY_MOD_LOGS_FILE):
+        # One-time migration: the legacy file holds the whole list, newest first.
+        legacy_logs = load_json(LEGACY_MOD_LOGS_FILE, default_data={'logs': []}).get('logs', [])
+        print(f"INFO: Migrating {len(legacy_logs)} log entries from {LEGACY_MOD_LOGS_FILE} to {MOD_LOGS_FILE}.")
+        # Written atomically: a partial .jsonl would stop the migration from ever being retried
+        raw = b''.join(dumps_json_line(entry) for entry in reversed(legacy_logs))
+        if not write_file(MOD_LOGS_FILE, raw):
+            print(f"ERROR: Could not migrate {LEGACY_MOD_LOGS_FILE}; using it as-is for now.")
+            return legacy_logs
+
+    logs = []
     try:
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=4)
+        with open(MOD_LOGS_FILE, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    logs.append(loads_json(line))
+                except json.JSONDecodeError as e:
+                    print(f"ERROR: Skipping unreadable line in {MOD_LOGS_FILE}: {e}")
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        print(f"ERROR: Failed to save data to {filepath}: {e}")
+        print(f"ERROR: Failed to read {MOD_LOGS_FILE}. {e}")
+    logs.reverse()
+    return logs
 
 def load_initial_data():
-    """Loads both moderation logs and server metrics upon bot startup."""
-    global MOD_LOGS
-    global SERVER_METRICS
+    """
+    Loads both moderation logs and server metrics upon bot startup.
 
-    # 1. Load/Initialize Permanent Record
-    MOD_LOGS = load_json(MOD_LOGS_FILE, default_data={'logs': []})
+    NOTE: app.BotLoopThread calls this again once it holds the bot lock, so a worker
+    booted during a reload picks up everything the previous bot wrote before exiting.
+    """
+    global SERVER_METRICS
+    global BANNED_IDS
+    global INCIDENTS_BY_TARGET
+
+    # 1. Load/Initialize Permanent Record (only the indexes are kept; the file holds the entries)
+    logs = load_mod_logs()
+    BANNED_IDS = {log['target_id'] for log in logs if log['action'] == 'BAN'}
+    INCIDENTS_BY_TARGET = collections.defaultdict(collections.deque)
+    for log in reversed(logs):
+        if log['action'] in INCIDENT_ACTIONS:
+            INCIDENTS_BY_TARGET[log['target_id']].appendleft(log)
     
     # 2. Load/Initialize Operational Metrics
     default_metrics = {
@@ -110,45 +280,66 @@ def load_initial_data():
         }
     }
     SERVER_METRICS = load_json(METRICS_FILE, default_metrics)
-    # Restore last known channel activity from file to memory
+    # Older files stored join/leave times as ISO strings; keep them as Unix seconds now
+    for key in ('members_joined', 'members_left'):
+        SERVER_METRICS[key] = [
+            int(datetime.fromisoformat(t).timestamp()) if isinstance(t, str) else t
+            for t in SERVER_METRICS.get(key, [])
+        ]
+    # No longer recorded (the live guild object has the member count)
+    SERVER_METRICS.get('monthly_summary', {}).pop('member_count_at_action', None)
+    # In-memory trackers start over on a reload; only what was saved to file carries across
+    CHANNEL_ACTIVITY.clear()
+    ACTIVE_CHATTERS.clear()
+    # Restore last known channel activity from file to memory (JSON keys are always strings)
     for k, v in SERVER_METRICS.get('messages_by_channel', {}).items():
         CHANNEL_ACTIVITY[int(k)] = v
+    # Share the live counter dict so saving needs no copy; int keys are written as strings
+    SERVER_METRICS['messages_by_channel'] = CHANNEL_ACTIVITY
 
 load_initial_data() 
 
 # --- METRICS & DATA MANAGEMENT FUNCTIONS ---
 
-def update_log_and_metrics(action, target_id, moderator_id, reason, guild_members=None):
+def update_log_and_metrics(action, target_id, moderator_id, reason):
     """Saves a log entry (The Chalkboard) and updates metrics."""
-    timestamp = datetime.now().isoformat()
+    now = datetime.now()
     
     log_entry = {
-        'timestamp': timestamp,
+        'timestamp': now.isoformat(),
         'action': action,
         'target_id': str(target_id),
         'moderator_id': str(moderator_id),
         'reason': reason,
     }
     
-    MOD_LOGS['logs'].insert(0, log_entry) 
-    save_json(MOD_LOGS_FILE, MOD_LOGS)
+    append_jsonl(MOD_LOGS_FILE, log_entry)
+    if action == 'BAN':
+        BANNED_IDS.add(log_entry['target_id'])
     
     # Update monthly metrics
-    if action in ['MUTE', 'BAN', 'KICK']:
-        update_monthly_metric(f'total_{action.lower()}s')
-    
-    if guild_members:
-        SERVER_METRICS['monthly_summary']['member_count_at_action'] = len(guild_members)
-    save_json(METRICS_FILE, SERVER_METRICS)
+    if action in INCIDENT_ACTIONS:
+        INCIDENTS_BY_TARGET[log_entry['target_id']].appendleft(log_entry)
+        update_monthly_metric(f'total_{action.lower()}s', now)
+
 
+# (last_reset string, parsed date) so the stored date is only re-parsed when it changes
+_LAST_RESET_CACHE = (None, None)
 
-def update_monthly_metric(key):
-    """Increments a counter in the SERVER_METRICS monthly_summary and saves."""
+def parse_last_reset(last_reset_str):
+    """Returns the date for a monthly_summary 'last_reset' string, cached per value."""
+    global _LAST_RESET_CACHE
+    if _LAST_RESET_CACHE[0] != last_reset_str:
+        _LAST_RESET_CACHE = (last_reset_str, datetime.fromisoformat(last_reset_str).date())
+    return _LAST_RESET_CACHE[1]
+
+def update_monthly_metric(key, now=None):
+    """Increments a counter in the SERVER_METRICS monthly_summary (saved by the next flush)."""
     global SERVER_METRICS
     
-    today = datetime.now().date()
+    today = (now or datetime.now()).date()
     last_reset_str = SERVER_METRICS['monthly_summary'].get('last_reset', str(today))
-    last_reset_date = datetime.fromisoformat(last_reset_str).date()
+    last_reset_date = parse_last_reset(last_reset_str)
     
     # Simple monthly reset logic
     if today.month != last_reset_date.month:
@@ -162,17 +353,63 @@ def update_monthly_metric(key):
 
     if key in SERVER_METRICS['monthly_summary']:
         SERVER_METRICS['monthly_summary'][key] += 1
-        save_json(METRICS_FILE, SERVER_METRICS)
+        mark_metrics_dirty()
+
+
+def mark_metrics_dirty():
+    """Flags SERVER_METRICS as changed so the saver loop writes it (event loop only)."""
+    METRICS_DIRTY.set()
+
+def trim_member_events():
+    """Drops join/leave timestamps older than MEMBER_EVENT_RETENTION (the lists are in time order)."""
+    cutoff = time.time() - MEMBER_EVENT_RETENTION
+    for key in ('members_joined', 'members_left'):
+        events = SERVER_METRICS[key]
+        expired = bisect.bisect_right(events, cutoff)
+        if expired:
+            del events[:expired]
+            mark_metrics_dirty()
+
+def snapshot_metrics():
+    """Serializes SERVER_METRICS if it changed since the last write (None otherwise)."""
+    if not METRICS_DIRTY.is_set():
+        return None
+    METRICS_DIRTY.clear()
+    return dumps_json(SERVER_METRICS, compact=True) # Only the dashboard reads this file
+
+def flush_metrics():
+    """Writes SERVER_METRICS to disk, but only if something changed since the last write."""
+    raw = snapshot_metrics()
+    if raw is not None and not write_file(METRICS_FILE, raw):
+        mark_metrics_dirty()
+
+# Event handlers only touch memory; whatever the saver loop has not written yet goes out on exit.
+atexit.register(flush_metrics)
 
 
-@tasks.loop(minutes=1.0)
 async def metric_saver_loop():
-    """Background loop to periodically save in-memory metrics to disk."""
-    global SERVER_METRICS
-    
-    SERVER_METRICS['messages_by_channel'] = {str(k): v for k, v in CHANNEL_ACTIVITY.items()}
-    
-    save_json(METRICS_FILE, SERVER_METRICS)
+    """
+    Saves in-memory metrics to disk once they change.
+
+    NOTE: Each pass sleeps until something marks the metrics dirty, so an idle server
+    does no work, then waits 10s so every change in that window goes out in one write.
+    A failed write marks them dirty again, so it is retried on the next pass.
+    """
+    while True:
+        await METRICS_DIRTY.wait()
+        await asyncio.sleep(10.0)
+        try:
+            prune_active_chatters()
+            trim_member_events()
+
+            # Serialize here, where the metrics are mutated, and only hand the bytes to a thread,
+            # so the disk write never blocks the event loop.
+            raw = snapshot_metrics()
+            if raw is not None and not await asyncio.to_thread(write_file, METRICS_FILE, raw):
+                mark_metrics_dirty()
+        except Exception as e:
+            print(f"ERROR: Metric saver failed: {e}")
+            mark_metrics_dirty()
 
 
 # --- DISCORD EVENTS ---
@@ -184,8 +421,28 @@ async def on_ready():
     print(f'Aura (The Caretaker) is ONLINE. Logged in as: {bot.user.name}')
     print('---------------------------------')
     
-    if not metric_saver_loop.is_running():
-        metric_saver_loop.start()
+    global METRICS_SAVER_TASK
+
+    # Roles may have changed while disconnected
+    ROLE_CACHE.clear()
+
+    # on_ready fires again after every reconnect; keep the one saver task running
+    if METRICS_SAVER_TASK is None or METRICS_SAVER_TASK.done():
+        METRICS_SAVER_TASK = asyncio.create_task(metric_saver_loop())
+
+
+# Any role change drops that guild's name -> id map; get_role() rebuilds it on next use.
+@bot.event
+async def on_guild_role_create(role):
+    ROLE_CACHE.pop(role.guild.id, None)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    ROLE_CACHE.pop(after.guild.id, None)
+
+@bot.event
+async def on_guild_role_delete(role):
+    ROLE_CACHE.pop(role.guild.id, None)
 
 
 @bot.event
@@ -194,9 +451,7 @@ async def on_member_join(member):
     Handles ban evasion check and sends a warm welcome message.
     """
     # 1. Ban Evasion Check
-    is_banned = any(log['target_id'] == str(member.id) and log['action'] == 'BAN' for log in MOD_LOGS['logs'])
-    
-    if is_banned:
+    if str(member.id) in BANNED_IDS:
         try:
             await member.ban(reason="Auto-Barring Protocol: Detected prior BAN record in Guestbook.")
             mod_channel = bot.get_channel(MOD_ALERT_CHANNEL_ID)
@@ -211,17 +466,13 @@ async def on_member_join(member):
     welcome_channel = bot.get_channel(WELCOME_CHANNEL_ID)
     if welcome_channel:
         try:
-            await welcome_channel.send(
-                f"🏡 **Welcome to the Hangout, {member.mention}!** I'm Aura, here to keep things cozy. "
-                f"The **[Host]** (that's the owner!) will give you the **[Regular]** role soon. "
-                "While you wait, check out **#house-rules**!"
-            )
+            await welcome_channel.send(WELCOME_TEMPLATE.format(mention=member.mention))
         except Exception as e:
             print(f"ERROR: Could not send welcome message: {e}")
 
     # 3. Metric Logging
-    SERVER_METRICS['members_joined'].append(datetime.now().isoformat())
-    save_json(METRICS_FILE, SERVER_METRICS)
+    SERVER_METRICS['members_joined'].append(int(time.time()))
+    mark_metrics_dirty()
 
 
 @bot.event
@@ -229,8 +480,8 @@ async def on_member_remove(member):
     """
     Logs the leave event for metrics.
     """
-    SERVER_METRICS['members_left'].append(datetime.now().isoformat())
-    save_json(METRICS_FILE, SERVER_METRICS)
+    SERVER_METRICS['members_left'].append(int(time.time()))
+    mark_metrics_dirty()
 
 
 @bot.event
@@ -241,24 +492,20 @@ async def on_message(message):
         return
 
     # --- METRIC TRACKING ---
-    user_id = str(message.author.id)
-    if user_id not in ACTIVE_CHATTERS:
-        ACTIVE_CHATTERS.add(user_id)
-        
+    ACTIVE_CHATTERS[str(message.author.id)] = time.time()
     CHANNEL_ACTIVITY[message.channel.id] += 1
+    mark_metrics_dirty()
 
     # --- CONTENT FILTERING (Keeping the Space Clean) ---
     
     # 1. Spam Link Filter (still important even for private servers)
-    suspicious_links = ['bit.ly', 'tinyurl.com', '.xyz', '.cc', 'discord.gg']
-    if any(link in message.content.lower() for link in suspicious_links) and not message.author.guild_permissions.manage_messages:
+    if SUSPICIOUS_LINKS_RE.search(message.content) and not message.author.guild_permissions.manage_messages:
         try:
             await message.delete()
-            notice_message = await message.channel.send(
-                f"**Aura:** {message.author.mention}, that link looks spammy. Removed to keep the space secure."
+            await message.channel.send(
+                f"**Aura:** {message.author.mention}, that link looks spammy. Removed to keep the space secure.",
+                delete_after=5
             )
-            await asyncio.sleep(5)
-            await notice_message.delete()
             return
         except discord.errors.Forbidden:
             pass # Cannot delete message
@@ -297,26 +544,32 @@ async def vibe_command(ctx, *, topic: str):
         max_retries = 3
         delay = 1
         
+        session = get_http_session()
         for i in range(max_retries):
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{GEMINI_API_URL}?key={API_KEY}", json=payload) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Error: No response text found.')
-                        
-                        # 5. Send the result
-                        await ctx.send(f"🌳 **Aura's Vibe Check:** {text}")
-                        return
-                    
-                    elif response.status == 429 and i < max_retries - 1:
-                        await asyncio.sleep(delay)
-                        delay *= 2
-                        continue # Retry
-                    
-                    else:
-                        error_text = await response.text()
-                        await ctx.send(f"❌ **Aura Error:** Could not connect to the Vibe stream. Status: {response.status}. Error: {error_text[:100]}...")
-                        return
+            # Only read the response inside the block, so the connection is back in the
+            # pool before any backoff sleep.
+            async with session.post(f"{GEMINI_API_URL}?key={API_KEY}", json=payload) as response:
+                status = response.status
+                if status == 200:
+                    data = await response.json()
+                else:
+                    error_text = await response.text()
+
+            if status == 200:
+                text = data.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', 'Error: No response text found.')
+                
+                # 5. Send the result
+                await ctx.send(f"🌳 **Aura's Vibe Check:** {text}")
+                return
+            
+            elif status == 429 and i < max_retries - 1:
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue # Retry
+            
+            else:
+                await ctx.send(f"❌ **Aura Error:** Could not connect to the Vibe stream. Status: {status}. Error: {error_text[:100]}...")
+                return
         
         await ctx.send("❌ **Aura Error:** The Vibe stream failed to connect after multiple retries.")
         
@@ -329,10 +582,8 @@ def is_moderator(ctx):
     """Check if the user has Co-Host permissions (manage_messages)."""
     return ctx.author.guild_permissions.manage_messages
 
-@bot.command(name='commands', help='[CO-HOST] Displays available Caretaker commands.')
-@commands.check(is_moderator)
-async def list_commands(ctx):
-    """Dynamically lists all moderator commands in an embed."""
+def build_mod_commands_embed():
+    """Builds the !commands embed with one entry per moderator-only command."""
     command_list = []
     
     for command in bot.commands:
@@ -350,8 +601,13 @@ async def list_commands(ctx):
     
     embed.add_field(name="HOUSEKEEPING & SECURITY", value="\n".join(command_list), inline=False)
     embed.set_footer(text=f"Aura Protocol | Prefix: {COMMAND_PREFIX}")
-    
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='commands', help='[CO-HOST] Displays available Caretaker commands.')
+@commands.check(is_moderator)
+async def list_commands(ctx):
+    """Lists all moderator commands in an embed (prepared once at import)."""
+    await ctx.send(embed=MOD_COMMANDS_EMBED)
 
 
 @bot.command(name='say', help='[CO-HOST] Aura broadcasts a message to a channel. Usage: !say #channel Your message here')
@@ -373,8 +629,9 @@ async def purge_command(ctx, count: int):
         return
         
     try:
-        deleted = await ctx.channel.purge(limit=count + 1)
-        notice = await ctx.send(f"🧹 Clutter Removed: Cleared **{len(deleted) - 1}** messages.", delete_after=5)
+        # bulk=True batches the deletes 100 per request (discord.py chunks larger counts itself)
+        deleted = await ctx.channel.purge(limit=count + 1, bulk=True, reason=f"!purge by {ctx.author}")
+        await ctx.send(f"🧹 Clutter Removed: Cleared **{len(deleted) - 1}** messages.", delete_after=5)
     except Exception as e:
         await ctx.send(f"❌ Aura Error during cleanup: {e}")
 
@@ -384,7 +641,7 @@ async def purge_command(ctx, count: int):
 async def kick_command(ctx, member: discord.Member, *, reason="No reason provided"):
     try:
         await member.kick(reason=reason)
-        update_log_and_metrics('KICK', member.id, ctx.author.id, reason, ctx.guild.members) 
+        update_log_and_metrics('KICK', member.id, ctx.author.id, reason) 
         
         embed = discord.Embed(
             title="🛑 TEMPORARY TIME-OUT: KICK", 
@@ -407,7 +664,7 @@ async def ban_command(ctx, member: discord.Member, *, reason="No reason provided
     # In a private server, only the Host (owner) should typically use this, but we use manage_messages check for simplicity
     try:
         await member.ban(reason=reason)
-        update_log_and_metrics('BAN', member.id, ctx.author.id, reason, ctx.guild.members)
+        update_log_and_metrics('BAN', member.id, ctx.author.id, reason)
 
         embed = discord.Embed(
             title="⛔ PERMANENT BARRING", 
@@ -427,7 +684,7 @@ async def ban_command(ctx, member: discord.Member, *, reason="No reason provided
 @bot.command(name='mute', help='[CO-HOST] Applies chat restriction (Time-Out). Usage: !mute @Guest reason')
 @commands.check(is_moderator)
 async def mute_command(ctx, member: discord.Member, *, reason="No reason provided"):
-    muted_role = discord.utils.get(ctx.guild.roles, name=MUTED_ROLE_NAME)
+    muted_role = get_role(ctx.guild, MUTED_ROLE_NAME)
     
     if not muted_role:
         await ctx.send(f"❌ Error: The required role '{MUTED_ROLE_NAME}' does not exist.", delete_after=10)
@@ -435,7 +692,7 @@ async def mute_command(ctx, member: discord.Member, *, reason="No reason provide
         
     try:
         await member.add_roles(muted_role, reason=reason)
-        update_log_and_metrics('MUTE', member.id, ctx.author.id, reason, ctx.guild.members)
+        update_log_and_metrics('MUTE', member.id, ctx.author.id, reason)
         
         embed = discord.Embed(
             title="🔇 CHAT TIME-OUT APPLIED", 
@@ -455,7 +712,7 @@ async def mute_command(ctx, member: discord.Member, *, reason="No reason provide
 @bot.command(name='unmute', help='[CO-HOST] Removes chat restriction. Usage: !unmute @Guest')
 @commands.check(is_moderator)
 async def unmute_command(ctx, member: discord.Member):
-    muted_role = discord.utils.get(ctx.guild.roles, name=MUTED_ROLE_NAME)
+    muted_role = get_role(ctx.guild, MUTED_ROLE_NAME)
     
     if not muted_role:
         await ctx.send(f"❌ Error: The required role '{MUTED_ROLE_NAME}' does not exist.", delete_after=10)
@@ -496,11 +753,11 @@ async def report_command(ctx, member: discord.Member, *, reason="No reason provi
 @commands.check(is_moderator)
 async def whois_command(ctx, member: discord.Member):
     target_id = str(member.id)
-    user_logs = [log for log in MOD_LOGS['logs'] if log['target_id'] == target_id]
+    incidents = INCIDENTS_BY_TARGET.get(target_id)
     
     embed = discord.Embed(
         title=f"📝 Guestbook Entry: {member.display_name}",
-        description=f"A check of their history in the Hangout.",
+        description="A check of their history in the Hangout." + (" ⛔ **Has a BAN on record.**" if target_id in BANNED_IDS else ""),
         color=discord.Color.green()
     )
     
@@ -510,23 +767,22 @@ async def whois_command(ctx, member: discord.Member):
         f"**Account Created:** {member.created_at.strftime('%Y-%m-%d %H:%M')}"
     ), inline=False)
     
-    if user_logs:
+    # Only MUTE, KICK, BAN are indexed for history
+    if incidents:
         history_summary = ""
-        # Only show MUTE, KICK, BAN for history
-        clean_logs = [log for log in user_logs if log['action'] in ['MUTE', 'KICK', 'BAN']]
-        
-        if clean_logs:
-            for log in clean_logs[:5]:
-                dt_obj = datetime.fromisoformat(log['timestamp'].replace('Z', ''))
-                time_str = dt_obj.strftime('%m/%d %H:%M')
-                
-                history_summary += f"**[{log['action']}** on {time_str}] Reason: {log['reason']}\n"
+        for log in itertools.islice(incidents, 5):
+            dt_obj = datetime.fromisoformat(log['timestamp'].replace('Z', ''))
+            time_str = dt_obj.strftime('%m/%d %H:%M')
             
-            embed.add_field(name=f"Sign-in History ({len(clean_logs)} Incidents)", value=history_summary, inline=False)
-        else:
-             embed.add_field(name="Sign-in History", value="Clean record. No recorded incidents.", inline=False)
+            history_summary += f"**[{log['action']}** on {time_str}] Reason: {log['reason']}\n"
+        
+        embed.add_field(name=f"Sign-in History ({len(incidents)} Incidents)", value=history_summary, inline=False)
         
     else:
         embed.add_field(name="Sign-in History", value="Clean record. No recorded incidents.", inline=False)
         
-    await ctx.send(embed=embed)
\ No newline at end of file
+    await ctx.send(embed=embed)
+
+
+# All commands are registered above, so the !commands listing never changes after import
+MOD_COMMANDS_EMBED = build_mod_commands_embed()
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# Gunicorn settings for Aura (picked up automatically from the working directory).
+
+# One worker on purpose: the Discord bot runs inside the worker process and the
+# /admin dashboard reads its in-memory state, so a second worker would either open a
+# duplicate gateway session or serve a dashboard with no bot behind it.
+workers = 1
+
+# Threaded worker so slow dashboard/landing requests do not block each other.
+worker_class = 'gthread'
+threads = 4
+
+# preload_app is deliberately left off: bot_logic loads its data files at import, and a
+# worker forked from a preloaded master (crash respawn, TTIN, HUP) would start from the
+# master's boot-time snapshot and overwrite everything recorded since with stale state.
+# Each worker imports the app (and reads the files) itself, in post_fork below.
+
+
+def post_fork(server, worker):
+    """Imports the app in the freshly forked worker and starts the Discord bot thread there."""
+    from app import start_bot_thread
+    start_bot_thread()
+
+
+def worker_exit(server, worker):
+    """Logs the bot out before the worker goes away (restarts, SIGTERM, max_requests)."""
+    import app
+    if app.bot_thread is not None:
+        app.bot_thread.stop()